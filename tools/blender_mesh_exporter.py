@@ -31,19 +31,14 @@ bl_info = {
 import bpy
 import struct
 import os
-import bmesh
+import numpy as np
 from bpy_extras.io_utils import ExportHelper
 from bpy.props import BoolProperty, FloatProperty, StringProperty
-from mathutils import Matrix, Vector
 
 
-def triangulate_mesh(mesh_data):
-    """Triangulate a mesh using bmesh (non-destructive)."""
-    bm = bmesh.new()
-    bm.from_mesh(mesh_data)
-    bmesh.ops.triangulate(bm, faces=bm.faces[:])
-    bm.to_mesh(mesh_data)
-    bm.free()
+MESH_MAGIC = 0x4853454D     # "MESH"
+MESH_VERSION = 1
+MESH_HEADER = struct.Struct('<4I')
 
 
 def export_mesh_object(context, obj, filepath, apply_modifiers, default_color):
@@ -60,10 +55,8 @@ def export_mesh_object(context, obj, filepath, apply_modifiers, default_color):
     if mesh is None:
         return False, "Could not get mesh data"
 
-    # Triangulate
-    triangulate_mesh(mesh)
-
-    # Ensure we have loop normals
+    # Triangulate (loop triangles split n-gons without modifying the mesh)
+    # and ensure we have loop normals
     mesh.calc_loop_triangles()
     if hasattr(mesh, 'calc_normals_split'):
         mesh.calc_normals_split()
@@ -87,69 +80,56 @@ def export_mesh_object(context, obj, filepath, apply_modifiers, default_color):
     # Check if the transform flips winding (negative determinant = odd number of negative scales)
     flip_winding = obj_matrix.determinant() < 0
 
-    # Build vertex data by iterating loop triangles
-    # Each unique (position, normal, color, uv) combination becomes a vertex
-    vertex_map = {}   # (pos_tuple, norm_tuple, color_tuple, uv_tuple) → index
-    vertices = []     # list of (pos, norm, color, uv) tuples
-    indices = []      # triangle indices
-
-    for tri in mesh.loop_triangles:
-        tri_indices = []
-        for loop_index in tri.loops:
-            loop = mesh.loops[loop_index]
-            vert = mesh.vertices[loop.vertex_index]
-
-            # Apply object transform to position, THEN convert coordinates
-            # Blender (x,y,z) → world space → D3D11 (x, z, -y)
-            world_pos = obj_matrix @ vert.co
-            px, py, pz = world_pos.x, world_pos.z, -world_pos.y
-
-            # Apply object normal matrix, normalize, then convert coordinates
-            if tri.use_smooth:
-                raw_norm = loop.normal  # per-loop split normal
-            else:
-                raw_norm = tri.normal   # flat face normal
-            world_norm = (norm_matrix @ Vector(raw_norm)).normalized()
-            nx, ny, nz = world_norm.x, world_norm.z, -world_norm.y
-
-            # Vertex color
-            if color_layer is not None:
-                if hasattr(color_layer, 'data') and len(color_layer.data) > loop_index:
-                    c = color_layer.data[loop_index].color
-                    cr, cg, cb, ca = c[0], c[1], c[2], c[3] if len(c) > 3 else 1.0
-                else:
-                    cr, cg, cb, ca = default_color
-            else:
-                cr, cg, cb, ca = default_color
-
-            # UV: flip V axis
-            if uv_layer is not None:
-                uv = uv_layer.data[loop_index].uv
-                u, v = uv.x, 1.0 - uv.y
-            else:
-                u, v = 0.0, 0.0
-
-            # Create unique vertex key (quantized for floating point matching)
-            def q(f): return round(f, 6)
-            key = (q(px), q(py), q(pz),
-                   q(nx), q(ny), q(nz),
-                   q(cr), q(cg), q(cb), q(ca),
-                   q(u), q(v))
-
-            if key in vertex_map:
-                tri_indices.append(vertex_map[key])
-            else:
-                idx = len(vertices)
-                vertex_map[key] = idx
-                vertices.append((px, py, pz, nx, ny, nz, cr, cg, cb, ca, u, v))
-                tri_indices.append(idx)
-
-        # Reverse winding order: CCW (Blender) → CW (D3D11)
-        # If object transform has negative determinant (mirrored), don't reverse (double-negative)
-        if flip_winding:
-            indices.extend([tri_indices[0], tri_indices[1], tri_indices[2]])
-        else:
-            indices.extend([tri_indices[0], tri_indices[2], tri_indices[1]])
+    # Fold the Blender (x,y,z) → D3D11 (x, z, -y) axis swap into both matrices
+    # so positions and normals each take a single matmul
+    axis_swap = np.array(((1.0, 0.0, 0.0), (0.0, 0.0, 1.0), (0.0, -1.0, 0.0)))
+    world = np.array(obj_matrix, dtype=np.float64)
+    pos_matrix = axis_swap @ world[:3, :3]
+    pos_offset = axis_swap @ world[:3, 3]
+    normal_matrix = axis_swap @ np.array(norm_matrix, dtype=np.float64)
+    # Blender's normals are unit length; only scale/shear changes that
+    renormalize = not np.allclose(normal_matrix @ normal_matrix.T, np.eye(3), atol=1e-6)
+
+    # Pull raw mesh data into flat arrays (one C call per attribute)
+    n_tris = len(mesh.loop_triangles)
+    n_loops = len(mesh.loops)
+
+    tri_loops = np.empty((n_tris, 3), dtype=np.int32)
+    mesh.loop_triangles.foreach_get("loops", tri_loops.ravel())
+    tri_smooth = np.empty(n_tris, dtype=bool)
+    mesh.loop_triangles.foreach_get("use_smooth", tri_smooth)
+    tri_normals = np.empty((n_tris, 3), dtype=np.float32)
+    mesh.loop_triangles.foreach_get("normal", tri_normals.ravel())
+
+    loop_verts = np.empty(n_loops, dtype=np.int32)
+    mesh.loops.foreach_get("vertex_index", loop_verts)
+
+    # Split normals are only needed when some triangle is smooth shaded
+    any_smooth = bool(tri_smooth.any())
+    all_smooth = bool(tri_smooth.all())
+    if any_smooth:
+        loop_normals = np.empty((n_loops, 3), dtype=np.float32)
+        mesh.loops.foreach_get("normal", loop_normals.ravel())
+
+    coords = np.empty((len(mesh.vertices), 3), dtype=np.float32)
+    mesh.vertices.foreach_get("co", coords.ravel())
+
+    # Vertex color per loop (point-domain attributes are spread to their loops).
+    # None means every vertex gets default_color.
+    loop_colors = None
+    if color_layer is not None and getattr(color_layer, 'domain', 'CORNER') == 'POINT':
+        point_colors = np.empty((len(color_layer.data), 4), dtype=np.float32)
+        color_layer.data.foreach_get("color", point_colors.ravel())
+        loop_colors = point_colors[loop_verts]
+    elif color_layer is not None and len(color_layer.data) == n_loops:
+        loop_colors = np.empty((n_loops, 4), dtype=np.float32)
+        color_layer.data.foreach_get("color", loop_colors.ravel())
+
+    # UV per loop (None means every vertex gets (0, 0))
+    loop_uvs = None
+    if uv_layer is not None:
+        loop_uvs = np.empty((n_loops, 2), dtype=np.float32)
+        uv_layer.data.foreach_get("uv", loop_uvs.ravel())
 
     # Clean up temporary mesh
     if apply_modifiers:
@@ -157,29 +137,101 @@ def export_mesh_object(context, obj, filepath, apply_modifiers, default_color):
     else:
         obj.to_mesh_clear()
 
-    if len(vertices) == 0 or len(indices) == 0:
+    if n_tris == 0:
         return False, "Mesh has no geometry"
 
+    # Reverse winding order: CCW (Blender) → CW (D3D11)
+    # If object transform has negative determinant (mirrored), don't reverse (double-negative)
+    # Done on the loop indices up front so the welded corners come out
+    # already in index-buffer order.
+    if not flip_winding:
+        tri_loops = tri_loops[:, [0, 2, 1]]
+    tri_loops = tri_loops.ravel()
+
+    # Build per-corner vertex data: one row per triangle corner
+    # Row layout: pos(3) + normal(3) + color(4) + uv(2) = 12 floats
+    corner_data = np.empty((n_tris * 3, 12), dtype=np.float64)
+
+    # Position: Blender (x,y,z) → world space → D3D11 (x, z, -y), per vertex
+    world_pos = coords @ pos_matrix.T + pos_offset
+    corner_data[:, 0:3] = world_pos[loop_verts[tri_loops]]
+
+    # Smooth triangles use the per-loop split normal, flat ones the face normal.
+    # Apply object normal matrix (with axis swap), then normalize if needed
+    if all_smooth:
+        raw_norm = loop_normals[tri_loops]
+    elif not any_smooth:
+        raw_norm = np.repeat(tri_normals, 3, axis=0)
+    else:
+        smooth = np.repeat(tri_smooth, 3)[:, None]
+        raw_norm = np.where(smooth, loop_normals[tri_loops], np.repeat(tri_normals, 3, axis=0))
+    world_norm = corner_data[:, 3:6]
+    np.matmul(raw_norm, normal_matrix.T, out=world_norm)
+    if renormalize:
+        lengths = np.sqrt(np.einsum('ij,ij->i', world_norm, world_norm))[:, None]
+        np.divide(world_norm, lengths, out=world_norm, where=lengths > 0.0)
+
+    # Only attributes that actually vary per corner take part in the weld key
+    key_columns = [0, 1, 2, 3, 4, 5]
+
+    if loop_colors is not None:
+        corner_data[:, 6:10] = loop_colors[tri_loops]
+        key_columns += [6, 7, 8, 9]
+    else:
+        corner_data[:, 6:10] = default_color
+
+    # UV: flip V axis
+    if loop_uvs is not None:
+        corner_data[:, 10:12] = loop_uvs[tri_loops]
+        corner_data[:, 11] = 1.0 - corner_data[:, 11]
+        key_columns += [10, 11]
+    else:
+        corner_data[:, 10:12] = 0.0
+
+    # Each unique (position, normal, color, uv) combination becomes a vertex.
+    # Quantize to integers (6 decimals) for floating point matching and weld
+    # rows as raw byte keys, then keep first-seen order so the vertex
+    # buffer follows triangle traversal order.
+    keys = corner_data[:, key_columns]
+    keys *= 1e6
+    np.rint(keys, out=keys)
+    keys = keys.astype(np.int64, order='C')
+    keys = keys.view(np.dtype((np.void, keys.itemsize * keys.shape[1]))).ravel()
+    _, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+    order = np.argsort(first)
+    remap = np.empty(len(order), dtype=np.uint32)
+    remap[order] = np.arange(len(order), dtype=np.uint32)
+
+    vertices = corner_data[first[order]].astype(np.float32)
+    indices = remap[inverse.reshape(-1)]
+
     # ---- Write binary file ----
     vertex_count = len(vertices)
     index_count = len(indices)
 
     os.makedirs(os.path.dirname(filepath), exist_ok=True)
 
-    with open(filepath, 'wb') as f:
-        # Header: magic, version, vertex count, index count
-        f.write(struct.pack('<I', 0x4853454D))   # "MESH"
-        f.write(struct.pack('<I', 1))             # version
-        f.write(struct.pack('<I', vertex_count))
-        f.write(struct.pack('<I', index_count))
-
-        # Vertices: pos(3f) + normal(3f) + color(4f) + uv(2f) = 12 floats = 48 bytes
-        for v in vertices:
-            f.write(struct.pack('<12f', *v))
-
-        # Indices: uint32
-        for i in indices:
-            f.write(struct.pack('<I', i))
+    # Write to a temporary file and swap it in, so the engine's model
+    # hot-reload never sees a half-written .mesh
+    tmp_path = filepath + ".tmp"
+    try:
+        with open(tmp_path, 'wb') as f:
+            # Header: magic, version, vertex count, index count
+            f.write(MESH_HEADER.pack(MESH_MAGIC, MESH_VERSION, vertex_count, index_count))
+
+            # Vertices: pos(3f) + normal(3f) + color(4f) + uv(2f) = 12 floats = 48 bytes
+            vertices.astype('<f4', copy=False).tofile(f)
+
+            # Indices: uint32
+            indices.astype('<u4', copy=False).tofile(f)
+
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, filepath)
+    except OSError as e:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return False, f"Could not write file: {e}"
 
     return True, f"Exported {vertex_count} verts, {index_count // 3} tris"
 